@@ -1,27 +1,58 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+import asyncio
+import logging
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request, Query
+from app.core.config import get_settings
 from app.services.vertex_service import VertexGenerator
 from app.services.supabase_service import SupabaseService
 from app.services.storage_service import StorageService
-from functools import lru_cache
-from urllib.parse import urlparse
+from pathlib import PurePosixPath
 from typing import Optional
 
+settings = get_settings()
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+_EXT_TO_MIME = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+}
+
+def _ext_and_mime(file: UploadFile) -> tuple[str, str]:
+    """
+    Returns (extension, content_type) for an upload.
+    Defaults to 'png' if the filename has no extension.
+    """
+    ext = PurePosixPath(file.filename or "").suffix.lstrip(".").lower() or "png"
+    return ext, file.content_type or _EXT_TO_MIME.get(ext, "application/octet-stream")
+
+def _validate_upload(file: UploadFile):
+    """
+    Rejects oversized or unsupported uploads before their body is read.
+    """
+    if file.size and file.size > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large (max {settings.MAX_UPLOAD_BYTES} bytes)")
+    # Judged on the resolved type, so a missing Content-Type header falls back to the extension
+    _, content_type = _ext_and_mime(file)
+    if content_type not in settings.ALLOWED_UPLOAD_MIME:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {content_type}")
+
+# Services are created once at startup (see lifespan in app/main.py)
 
 # Dependency to get the generator instance
-@lru_cache()
-def get_generator():
-    return VertexGenerator()
+def get_generator(request: Request) -> VertexGenerator:
+    return request.app.state.generator
 
 # Dependency to get the supabase service instance
-@lru_cache()
-def get_supabase_service():
-    return SupabaseService()
+def get_supabase_service(request: Request) -> SupabaseService:
+    return request.app.state.supabase
 
 # Dependency to get the storage service instance
-@lru_cache()
-def get_storage_service():
-    return StorageService()
+def get_storage_service(request: Request) -> StorageService:
+    return request.app.state.storage
 
 # --- Existing Routes (Text/Image Generation) ---
 @router.post("/text-to-image")
@@ -31,11 +62,25 @@ async def text_to_image(
     aspect_ratio: str = Form("1:1"),
     service: VertexGenerator = Depends(get_generator)
 ):
-    result = service.generate_text_to_image(prompt, aspect_ratio, user)
+    # Vertex calls are bounded by the generator's semaphore
+    result = await service.generate_text_to_image(prompt, aspect_ratio, user)
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
 
+@router.post("/text-to-image/batch")
+async def text_to_image_batch(
+    prompts: list[str] = Form(...),
+    user: str = Form(...),
+    aspect_ratio: str = Form("1:1"),
+    service: VertexGenerator = Depends(get_generator)
+):
+    if len(prompts) > settings.MAX_BATCH_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"Too many prompts (max {settings.MAX_BATCH_PROMPTS})")
+    # Per-prompt failures are returned in place rather than failing the whole batch
+    results = await service.generate_text_to_image_batch(prompts, aspect_ratio, user)
+    return {"results": results}
+
 @router.post("/image-to-image")
 async def image_to_image(
     prompt: str = Form(...), 
@@ -46,11 +91,12 @@ async def image_to_image(
     service: VertexGenerator = Depends(get_generator)
 ):
     if file:
+        _validate_upload(file)
         file_bytes = await file.read()
     else:
         file_bytes = None
     # Pass product_id to the service
-    result = service.generate_image_to_image(file_bytes, prompt, user, image_url, product_id=product_id)
+    result = await service.generate_image_to_image(file_bytes, prompt, user, image_url, product_id=product_id)
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
@@ -65,11 +111,12 @@ async def image_to_video(
     service: VertexGenerator = Depends(get_generator)
 ):
     if file:
+        _validate_upload(file)
         file_bytes = await file.read()
     else:
         file_bytes = None
     # Pass product_id to the service
-    result = service.generate_image_to_video(file_bytes, prompt, user, image_url, product_id=product_id)
+    result = await service.generate_image_to_video(file_bytes, prompt, user, image_url, product_id=product_id)
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
@@ -83,31 +130,27 @@ async def upsert_template(
     prompt: str = Form(...),
     file: UploadFile = File(...),  # Changed to accept file upload
     supabase: SupabaseService = Depends(get_supabase_service),
-    service: VertexGenerator = Depends(get_generator),
     storage: StorageService = Depends(get_storage_service)
 ):
-    # 1. Read the file content
-    file_bytes = await file.read()
-    
-    # 2. Determine file extension and content type
-    # Default to 'png' if extension is missing
-    ext = file.filename.split(".")[-1] if "." in file.filename else "png"
-    content_type = file.content_type or "image/png"
+    _validate_upload(file)
+
+    # 1. Determine file extension and content type
+    ext, content_type = _ext_and_mime(file)
 
-    # 3. Upload to GCS
+    # 2. Stream the upload to GCS
     # The storage service appends _{uuid}.{ext} to the prefix.
     # We set prefix to 'templates/{category}/img' to ensure it goes into the correct folder.
     # Example result: templates/shoes/img_a1b2c3d4.png
     gcs_prefix = f"templates/{category}/img"
     
     try:
-        # Uses StorageService.upload_bytes defined in storage_service.py
-        image_url = storage.upload_bytes(file_bytes, gcs_prefix, ext, content_type)
+        # Streams from the spooled upload file instead of buffering it with file.read()
+        image_url = (await storage.upload_stream_async(file, gcs_prefix, ext, content_type)).url
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload image to GCS: {str(e)}")
 
-    # 4. Upsert to Supabase with the new GCS URL
-    result = supabase.upsert_template(
+    # 3. Upsert to Supabase with the new GCS URL
+    result = await supabase.upsert_template(
         template_name=template_name,
         category=category,
         product_type=product_type,
@@ -137,61 +180,63 @@ async def list_templates(
     category: str,
     product_type: str,
     supabase: SupabaseService = Depends(get_supabase_service),
-    service: VertexGenerator = Depends(get_generator),
     storage: StorageService = Depends(get_storage_service)
 ):
     # 1. Fetch metadata from Supabase
-    templates = supabase.get_templates(category, product_type)
+    templates = await asyncio.to_thread(supabase.get_templates, category, product_type)
     
     if isinstance(templates, dict) and "error" in templates:
          raise HTTPException(status_code=500, detail=templates["error"])
 
-    # 2. Process each template to fetch and encode the image
-    results = []
-    for template in templates:
-        
-        # # Copy template to avoid mutating the original if cached somewhere (good practice)
-        temp_data = template.copy()
-        
-        image_url = temp_data.get("image_url")
-        parsed = urlparse(image_url)
-        temp_data["image_url"] = storage.generate_signed_url(parsed.path.lstrip("/").split("/", 1)[1])        
-        results.append(temp_data)
+    # 2. Sign every template image concurrently (each signature is a blocking crypto op)
+    # Rows come from SupabaseService's template cache, so copy them before rewriting image_url
+    results = [template.copy() for template in templates]
+    # Images outside our bucket can't be signed here and keep their stored URL
+    pending = []
+    for temp_data in results:
+        blob_name = storage.blob_name_from_url(temp_data.get("image_url"))
+        if blob_name:
+            pending.append((temp_data, blob_name))
+    signed_urls = await asyncio.gather(
+        *[storage.generate_signed_url_async(blob_name) for _, blob_name in pending]
+    )
+    for (temp_data, _), signed_url in zip(pending, signed_urls):
+        temp_data["image_url"] = signed_url
         
     return results
 
 @router.get("/assets")
 async def get_user_assets(
     user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     supabase: SupabaseService = Depends(get_supabase_service),
-    service: VertexGenerator = Depends(get_generator),
     storage: StorageService = Depends(get_storage_service)
 ):
     # 1. Fetch assets from Supabase
-    assets = supabase.get_user_assets(user_id)
+    assets = await supabase.get_user_assets(user_id, limit, offset)
     
     if isinstance(assets, dict) and "error" in assets:
         raise HTTPException(status_code=500, detail=assets["error"])
     
-    # 2. Process assets to generate signed URLs (Access control)
-    results = []
+    # 2. Collect the GCS blobs that need signed URLs (Access control)
+    # Asset rows are fresh from Supabase and not retained, so they are decorated in place
+    pending = []
     for asset in assets:
-        asset_data = asset.copy()
-        storage_path = asset_data.get("storage_path")
-        
-        # specific logic to handle GCS URLs
-        if storage_path and "storage.googleapis.com" in storage_path:
-            try:
-                parsed = urlparse(storage_path)
-                # URL format: https://storage.googleapis.com/{bucket_name}/{blob_name}
-                # We need to extract {blob_name}
-                path_parts = parsed.path.lstrip("/").split("/", 1)
-                if len(path_parts) > 1:
-                    blob_name = path_parts[1]
-                    asset_data["signed_url"] = storage.generate_signed_url(blob_name)
-            except Exception as e:
-                print(f"⚠️ Failed to generate signed URL for asset {asset.get('id', 'unknown')}: {e}")
-        
-        results.append(asset_data)
+        # Only GCS-hosted assets get a signed URL
+        blob_name = storage.blob_name_from_url(asset.get("storage_path"))
+        if blob_name:
+            pending.append((asset, blob_name))
+
+    # 3. Sign them concurrently; a failure on one asset must not fail the whole listing
+    signed_urls = await asyncio.gather(
+        *[storage.generate_signed_url_async(blob_name) for _, blob_name in pending],
+        return_exceptions=True
+    )
+    for (asset, _), signed_url in zip(pending, signed_urls):
+        if isinstance(signed_url, Exception):
+            logger.warning("Failed to generate signed URL for asset %s: %s", asset.get("asset_id", "unknown"), signed_url)
+        else:
+            asset["signed_url"] = signed_url
         
-    return results
\ No newline at end of file
+    return assets
\ No newline at end of file
@@ -15,19 +15,41 @@ class Settings(BaseSettings):
     
     # Storage Config
     GCS_BUCKET_NAME: str
+    # Lifetime of signed asset URLs, in seconds; cached URLs are reused until shortly before this
+    SIGNED_URL_EXPIRATION: int = 3600
     
     # Supabase Config
     SUPABASE_URL: str
     SUPABASE_KEY: str
     
+    # Upload Limits
+    MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    ALLOWED_UPLOAD_MIME: set[str] = {"image/png", "image/jpeg", "image/webp"}
+    # Uploaded inputs above this go to Vertex by gs:// URI once stored, instead of inline in the request
+    INLINE_IMAGE_MAX_BYTES: int = 1024 * 1024
+    # Prompts accepted by one /text-to-image/batch request
+    MAX_BATCH_PROMPTS: int = 10
+    
     # Model Config
     #IMAGE_MODEL_ID: str = "gemini-3-pro-image-preview"
     IMAGE_MODEL_ID: str = "gemini-3-pro-image-preview"
     VIDEO_MODEL_ID: str = "gemini-2.5-flash-image"
+    
+    # Concurrency Config
+    # Max in-flight Vertex generations per worker
+    VERTEX_CONCURRENCY: int = 10
+    # Max in-flight async GCS transfers and Supabase REST calls per worker
+    GCS_CONCURRENCY: int = 20
+    SUPABASE_CONCURRENCY: int = 20
+    # Uvicorn worker processes (same env var uvicorn's CLI reads)
+    WEB_CONCURRENCY: int = os.cpu_count() or 1
 
     class Config:
         env_file = ".env"
 
 @lru_cache()
 def get_settings():
-    return Settings()
\ No newline at end of file
+    settings = Settings()
+    # Google SDKs discover credentials through this env var; set it once, before any client is built
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", settings.GOOGLE_APPLICATION_CREDENTIALS)
+    return settings
\ No newline at end of file
@@ -1,14 +1,61 @@
-from fastapi import FastAPI
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.core.config import get_settings
 from app.api.routes import router as gen_router
+from app.services.storage_service import StorageService
+from app.services.supabase_service import SupabaseService
+from app.services.vertex_service import VertexGenerator
 
 settings = get_settings()
 
+# Module loggers use lazy %-formatting, so DEBUG calls cost nothing at INFO.
+# Records are handed to a queue and written to stderr by a listener thread,
+# so a slow log sink never blocks a request.
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _log_handler)
+# Formatting happens once, in the listener; basicConfig would also stamp its own prefix
+# onto each record as the QueueHandler prepares it
+_root_logger = logging.getLogger()
+_root_logger.addHandler(QueueHandler(_log_queue))
+_root_logger.setLevel(logging.INFO)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# uvloop is a drop-in, libuv-backed event loop; it isn't available on Windows,
+# so fall back to the stock asyncio loop for local development there.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    uvloop = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build each service once per worker; routes read them from app.state
+    app.state.storage = StorageService()
+    app.state.supabase = SupabaseService()
+    app.state.generator = VertexGenerator(storage=app.state.storage, supabase=app.state.supabase)
+    yield
+    # Reverse of construction: the generator's pending saves still need storage and Supabase
+    await app.state.generator.aclose()
+    await app.state.supabase.aclose()
+    await app.state.storage.aclose()
+
 app = FastAPI(
     title=settings.PROJECT_NAME, 
     version=settings.VERSION,
-    description="Production ready API for Gemini 2.5 & Veo"
+    description="Production ready API for Gemini 2.5 & Veo",
+    lifespan=lifespan,
+    # orjson encodes the template/asset listings several times faster than stdlib json
+    default_response_class=ORJSONResponse
 )
 
 # CORS Middleware (Essential for frontend integration)
@@ -20,6 +67,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized requests from the Content-Length header, before the body is read.
+# The multipart envelope adds a little overhead on top of the file itself.
+MAX_REQUEST_BYTES = settings.MAX_UPLOAD_BYTES + 1024 * 1024
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        return ORJSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
 # Include Routes
 app.include_router(gen_router, prefix="/generate", tags=["Generation"])
 
@@ -29,4 +87,12 @@ def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # One process per core; use `uvicorn app.main:app --reload` for auto-reloading local dev
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=settings.WEB_CONCURRENCY,
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools"
+    )
\ No newline at end of file
@@ -1,35 +1,247 @@
 import uuid
-import base64  # <--- Add this import
+import time
+import asyncio
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import google.auth
+import google_crc32c
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from gcloud.aio.storage import Storage as AioStorage
 from app.core.config import get_settings
 
+try:
+    # SIMD codec (AVX2/AVX-512/NEON, picked at runtime); drop-in for the stdlib encoder
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Signed URLs are valid for this long; cached ones are reused until shortly before expiry
+SIGNED_URL_EXPIRATION = settings.SIGNED_URL_EXPIRATION
+SIGNED_URL_REFRESH_MARGIN = min(60, SIGNED_URL_EXPIRATION // 10)
+SIGNED_URL_CACHE_SIZE = 10_000
+
+# Threads reserved for blocking GCS calls, so they don't starve the default executor
+STORAGE_MAX_WORKERS = 16
+
+# 57 KiB is a multiple of 3, so each chunk base64-encodes without padding (to 76 KiB)
+BASE64_CHUNK_SIZE = 57 * 1024
+# Ranged-download size for streamed reads; BlobReader would otherwise fetch up to 40 MiB per request
+DOWNLOAD_CHUNK_SIZE = 16 * BASE64_CHUNK_SIZE
+
+# Payloads above this (typically generated MP4s) are always sent as resumable uploads;
+# below it gcloud-aio picks the upload type itself
+RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024
+
+# Bounds in-flight transfers on the asyncio client; the sync paths are bounded by STORAGE_MAX_WORKERS
+_GCS_SEM = asyncio.Semaphore(settings.GCS_CONCURRENCY)
+
+# HTTP connection pool for the sync client; sized above STORAGE_MAX_WORKERS so threads never queue
+GCS_POOL_SIZE = 50
+# (connect, read) seconds per GCS operation, so a hung transfer can't pin a thread forever
+GCS_TIMEOUT = (10, 120)
+
+class UploadResult(NamedTuple):
+    """
+    Where an upload landed; unpacks like the (public_url, blob_name) tuple it replaces.
+    """
+    url: str
+    object_name: str
+
+def _crc32c(data: bytes) -> str:
+    """
+    Base64 CRC32C of data, as GCS expects it; computed in C (SSE4.2/ARM CRC instructions).
+    """
+    return base64.b64encode(google_crc32c.value(data).to_bytes(4, "big")).decode("ascii")
+
+def create_http_session() -> AuthorizedSession:
+    """
+    Builds an authorized HTTP session for GCS that can be shared and closed explicitly.
+    """
+    credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+    session = AuthorizedSession(credentials)
+    # Pool sizing only: google-cloud-storage retries transient errors itself, and a urllib3 retry
+    # layered underneath would multiply its attempts and raise errors its retry predicate doesn't know
+    adapter = HTTPAdapter(pool_connections=GCS_POOL_SIZE, pool_maxsize=GCS_POOL_SIZE)
+    session.mount("https://", adapter)
+    logger.debug("GCS HTTP session pool: %d connections", GCS_POOL_SIZE)
+    return session
 
 class StorageService:
-    # ... existing __init__ ...
-    def __init__(self):
+    def __init__(self, http: AuthorizedSession = None):
+        self._executor = ThreadPoolExecutor(max_workers=STORAGE_MAX_WORKERS, thread_name_prefix="gcs")
         try:
-            self.client = storage.Client()
+            # Every GCS call (uploads, downloads) goes through one keep-alive session
+            self.http = http or create_http_session()
+            self.client = storage.Client(credentials=self.http.credentials, _http=self.http)
+            # Native asyncio client (aiohttp) for the upload/download hot paths; it opens
+            # its shared ClientSession lazily, on first use inside the event loop
+            self.aio = AioStorage()
             self.bucket_name = settings.GCS_BUCKET_NAME
-            print(f"✅ GCS Client initialized for bucket: {self.bucket_name}")
+            # Built once; Client.bucket() allocates a new Bucket on every call
+            self.bucket = self.client.bucket(self.bucket_name)
+            # Public URL structure: https://storage.googleapis.com/{bucket_name}/{blob_name}
+            self._url_prefix = f"https://storage.googleapis.com/{self.bucket_name}/"
+            self._gs_prefix = f"gs://{self.bucket_name}/"
+            # blob_name -> (url, monotonic refresh deadline), least recently used first
+            self._signed_url_cache = OrderedDict()
+            self._signed_url_lock = threading.Lock()
+            logger.info("GCS client initialized for bucket: %s", self.bucket_name)
         except Exception as e:
-            print(f"❌ Failed to initialize GCS: {e}")
+            logger.exception("Failed to initialize GCS: %s", e)
+            self.http = None
             self.client = None
+            self.aio = None
+
+    def close(self):
+        """
+        Releases the pooled connections held by the HTTP session.
+        """
+        if self.http:
+            self.http.close()
+        self._executor.shutdown(wait=False)
+
+    async def aclose(self):
+        """
+        Closes the asyncio client's session, then the sync resources.
+        """
+        if self.aio:
+            await self.aio.close()
+        self.close()
+
+    async def _run(self, fn, *args, **kwargs):
+        # Runs a blocking GCS call on the storage thread pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
 
-    # ... existing upload_bytes ...
-    def upload_bytes(self, data: bytes, prefix: str, ext: str, content_type: str) -> str:
-        # (Existing implementation)
+    def blob_name_from_url(self, url: str):
+        """
+        Returns the blob name for a public URL in our bucket, or None for any other URL.
+        URL structure: https://storage.googleapis.com/{bucket_name}/{blob_name}
+        """
+        if not self.client or not url or not url.startswith(self._url_prefix):
+            return None
+        return url[len(self._url_prefix):]
+
+    def gcs_uri(self, url: str):
+        """
+        Returns the gs:// URI for a public URL in our bucket, or None for any other URL.
+        """
+        blob_name = self.blob_name_from_url(url)
+        return f"{self._gs_prefix}{blob_name}" if blob_name else None
+
+    def blob_name_from_gcs_uri(self, uri: str):
+        """
+        Returns the blob name for a gs:// URI in our bucket, or None for any other URI.
+        """
+        if not self.client or not uri or not uri.startswith(self._gs_prefix):
+            return None
+        return uri[len(self._gs_prefix):]
+
+    def public_url(self, blob_name: str) -> str:
+        return f"{self._url_prefix}{blob_name}"
+
+    @staticmethod
+    def new_blob_name(prefix: str, ext: str) -> str:
+        return f"{prefix}_{uuid.uuid4().hex[:8]}.{ext}"
+
+    # --- Async variants (safe to await from request handlers) ---
+    async def upload_bytes_async(self, data: bytes, prefix: str, ext: str, content_type: str, blob_name: str = None) -> UploadResult:
+        """
+        Uploads bytes over the asyncio client; no thread is held while the upload is in flight.
+        Pass blob_name (from new_blob_name) to upload to a path chosen in advance.
+        Returns an UploadResult of (url, object_name).
+        """
+        if not self.aio:
+            raise Exception("Storage client not available")
+
+        try:
+            filename = blob_name or self.new_blob_name(prefix, ext)
+            async with _GCS_SEM:
+                # GCS checks the sent crc32c against what it stored, rejecting the upload on mismatch
+                await self.aio.upload(
+                    self.bucket_name, filename, data, content_type=content_type,
+                    metadata={"crc32c": _crc32c(data)},
+                    # None, not False: False would force a simple upload and override the library's own cutoff
+                    force_resumable_upload=True if len(data) > RESUMABLE_UPLOAD_THRESHOLD else None,
+                    timeout=GCS_TIMEOUT[1]
+                )
+            return UploadResult(self.public_url(filename), filename)
+        except Exception as e:
+            logger.exception("GCS upload error: %s", e)
+            raise e
+
+    async def blob_size_async(self, blob_name: str) -> int:
+        """
+        Returns the stored object's size in bytes, from its metadata only.
+        """
+        if not self.aio:
+            raise Exception("Storage client not available")
+
+        async with _GCS_SEM:
+            metadata = await self.aio.download_metadata(self.bucket_name, blob_name, timeout=GCS_TIMEOUT[1])
+        return int(metadata["size"])
+
+    async def upload_stream_async(self, file_obj, prefix: str, ext: str, content_type: str) -> UploadResult:
+        return await self._run(self.upload_stream, file_obj, prefix, ext, content_type)
+
+    async def download_image_as_base64_async(self, image_url: str) -> str:
+        return await self._run(self.download_image_as_base64, image_url)
+
+    async def download_image_as_bytes_async(self, image_url: str) -> bytes:
+        """
+        Downloads image from GCS URL over the asyncio client and returns raw bytes.
+        """
+        if not self.aio:
+            logger.error("Storage client not available")
+            return None
+
+        try:
+            blob_name = self.blob_name_from_url(image_url)
+            if not blob_name:
+                logger.warning("URL %s does not match expected bucket prefix.", image_url)
+                return None
+
+            async with _GCS_SEM:
+                return await self.aio.download(self.bucket_name, blob_name, timeout=GCS_TIMEOUT[1])
+        except Exception as e:
+            logger.exception("GCS download error for %s: %s", image_url, e)
+            return None
+
+    async def generate_signed_url_async(self, blob_name: str) -> str:
+        return await self._run(self.generate_signed_url, blob_name)
+
+    def upload_stream(self, file_obj, prefix: str, ext: str, content_type: str) -> UploadResult:
+        """
+        Uploads a file-like object to GCS without reading it fully into memory.
+        Accepts a Starlette UploadFile or any binary file object.
+        Returns an UploadResult of (url, object_name).
+        """
         if not self.client:
             raise Exception("Storage client not available")
 
+        # UploadFile keeps its payload in a SpooledTemporaryFile; stream from that directly
+        stream = getattr(file_obj, "file", file_obj)
+
         try:
-            filename = f"{prefix}_{uuid.uuid4().hex[:8]}.{ext}"
-            bucket = self.client.bucket(self.bucket_name)
-            blob = bucket.blob(filename)
-            blob.upload_from_string(data, content_type=content_type)
-            return f"https://storage.googleapis.com/{self.bucket_name}/{filename}"
+            filename = self.new_blob_name(prefix, ext)
+            blob = self.bucket.blob(filename)
+            # A known size lets the client send one multipart POST (up to 8 MB) instead of opening a resumable session
+            blob.upload_from_file(
+                stream, content_type=content_type, size=getattr(file_obj, "size", None),
+                rewind=True, timeout=GCS_TIMEOUT
+            )
+            return UploadResult(self.public_url(filename), filename)
         except Exception as e:
-            print(f"❌ GCS Upload Error: {e}")
+            logger.exception("GCS upload error: %s", e)
             raise e
 
     # --- NEW METHOD ---
@@ -38,29 +250,28 @@ class StorageService:
         Downloads image from GCS URL and returns base64 string.
         """
         if not self.client:
-            print("❌ Storage client not available")
+            logger.error("Storage client not available")
             return None
         
         try:
             # Extract blob name from the public URL
-            # URL structure: https://storage.googleapis.com/{bucket_name}/{blob_name}
-            url_prefix = f"https://storage.googleapis.com/{self.bucket_name}/"
-            
-            if not image_url.startswith(url_prefix):
-                print(f"⚠️ URL {image_url} does not match expected bucket prefix.")
+            blob_name = self.blob_name_from_url(image_url)
+            if not blob_name:
+                logger.warning("URL %s does not match expected bucket prefix.", image_url)
                 return None
             
-            blob_name = image_url.replace(url_prefix, "")
-            bucket = self.client.bucket(self.bucket_name)
-            blob = bucket.blob(blob_name)
+            blob = self.bucket.blob(blob_name)
             
-            # Download as bytes
-            image_bytes = blob.download_as_bytes()
+            # Stream the object in ranged reads and encode chunk by chunk, so at most
+            # DOWNLOAD_CHUNK_SIZE of the raw payload is held at once
+            encoded = bytearray()
+            with blob.open("rb", chunk_size=DOWNLOAD_CHUNK_SIZE) as stream:
+                while chunk := stream.read(BASE64_CHUNK_SIZE):
+                    encoded += base64.b64encode(chunk)
             
-            # Convert to base64
-            return base64.b64encode(image_bytes).decode("utf-8")
+            return encoded.decode("ascii")
         except Exception as e:
-            print(f"❌ GCS Download Error for {image_url}: {e}")
+            logger.exception("GCS download error for %s: %s", image_url, e)
             return None
     
     def download_image_as_bytes(self, image_url: str) -> bytes:
@@ -68,26 +279,40 @@ class StorageService:
         Downloads image from GCS URL and returns raw bytes.
         """
         if not self.client:
-            print("❌ Storage client not available")
+            logger.error("Storage client not available")
             return None
         
         try:
-            # URL structure: https://storage.googleapis.com/{bucket_name}/{blob_name}
-            url_prefix = f"https://storage.googleapis.com/{self.bucket_name}/"
-            
-            if not image_url.startswith(url_prefix):
-                print(f"⚠️ URL {image_url} does not match expected bucket prefix.")
+            blob_name = self.blob_name_from_url(image_url)
+            if not blob_name:
+                logger.warning("URL %s does not match expected bucket prefix.", image_url)
                 return None
             
-            blob_name = image_url.replace(url_prefix, "")
-            bucket = self.client.bucket(self.bucket_name)
-            blob = bucket.blob(blob_name)
+            blob = self.bucket.blob(blob_name)
             
-            return blob.download_as_bytes()
+            return blob.download_as_bytes(timeout=GCS_TIMEOUT)
         except Exception as e:
-            print(f"❌ GCS Download Error for {image_url}: {e}")
+            logger.exception("GCS download error for %s: %s", image_url, e)
             return None
 
     def generate_signed_url(self, blob_name):
-        blob = self.client.bucket(self.bucket_name).blob(blob_name)
-        return blob.generate_signed_url(version="v4", expiration=3600)    
\ No newline at end of file
+        """
+        Returns a v4 signed URL for the blob, reusing a cached one while it is still valid.
+        Safe to call from worker threads.
+        """
+        now = time.monotonic()
+        with self._signed_url_lock:
+            cached = self._signed_url_cache.get(blob_name)
+            if cached and cached[1] > now:
+                self._signed_url_cache.move_to_end(blob_name)
+                return cached[0]
+
+        blob = self.bucket.blob(blob_name)
+        url = blob.generate_signed_url(version="v4", expiration=SIGNED_URL_EXPIRATION)
+
+        with self._signed_url_lock:
+            self._signed_url_cache[blob_name] = (url, now + SIGNED_URL_EXPIRATION - SIGNED_URL_REFRESH_MARGIN)
+            self._signed_url_cache.move_to_end(blob_name)
+            if len(self._signed_url_cache) > SIGNED_URL_CACHE_SIZE:
+                self._signed_url_cache.popitem(last=False)
+        return url
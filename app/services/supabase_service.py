@@ -1,19 +1,104 @@
+import asyncio
+import logging
+import threading
+import httpx
 from datetime import datetime, timezone
-from supabase import create_client, Client
+from functools import lru_cache
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+from postgrest import AsyncPostgrestClient
+from supabase import create_client, Client, ClientOptions
 from app.core.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Templates change rarely; serve browse queries from memory for this many seconds
+TEMPLATE_CACHE_TTL = 60
+TEMPLATE_CACHE_SIZE = 1024
+
+# Asset inserts arriving within this window (or until this many rows) go out as one insert
+ASSET_BATCH_WINDOW = 0.05
+ASSET_BATCH_MAX = 500
+# On shutdown, wait this long for queued asset rows to be written before giving up on them
+ASSET_FLUSH_TIMEOUT = 10
+
+SUPABASE_TIMEOUT = 30
+# Sync client pool, used by the template reads running on worker threads
+SUPABASE_MAX_CONNECTIONS = 50
+# Async client pool (HTTP/2), shared by request handlers and the insert drainer
+SUPABASE_ASYNC_MAX_CONNECTIONS = 200
+SUPABASE_ASYNC_MAX_KEEPALIVE = 100
+# Bounds in-flight REST calls on the async client, below its connection pool size
+_SUPABASE_SEM = asyncio.Semaphore(settings.SUPABASE_CONCURRENCY)
+
+# Columns returned by the asset listing, newest first, one page at a time
+ASSET_LIST_FIELDS = "asset_id,type,source,storage_path,created_at"
+ASSET_PAGE_SIZE = 50
+
+@lru_cache(maxsize=1)
+def _supabase_client() -> Client:
+    """
+    One Supabase client (and one keep-alive connection pool) per process.
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=SUPABASE_MAX_CONNECTIONS, max_keepalive_connections=SUPABASE_MAX_CONNECTIONS),
+        timeout=SUPABASE_TIMEOUT
+    )
+    options = ClientOptions(schema="public", postgrest_client_timeout=SUPABASE_TIMEOUT, httpx_client=http_client)
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY, options=options)
+
+def _async_rest_client() -> AsyncPostgrestClient:
+    """
+    asyncio PostgREST client over a kept-alive HTTP/2 pool, for the write and asset-listing paths.
+    """
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=SUPABASE_ASYNC_MAX_CONNECTIONS, max_keepalive_connections=SUPABASE_ASYNC_MAX_KEEPALIVE),
+        timeout=SUPABASE_TIMEOUT
+    )
+    return AsyncPostgrestClient(
+        f"{settings.SUPABASE_URL}/rest/v1",
+        headers={"apikey": settings.SUPABASE_KEY, "Authorization": f"Bearer {settings.SUPABASE_KEY}"},
+        http_client=http_client
+    )
 
 class SupabaseService:
     def __init__(self):
+        # Created lazily on first insert, inside the running event loop
+        self._insert_queue = None
+        self._insert_task = None
         try:
-            self.client: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-            print("✅ Supabase Client initialized.")
+            self.client: Client = _supabase_client()
+            self.rest = _async_rest_client()
+            # Read/written from worker threads (the template reads run via asyncio.to_thread)
+            self._template_cache = TTLCache(maxsize=TEMPLATE_CACHE_SIZE, ttl=TEMPLATE_CACHE_TTL)
+            self._template_lock = threading.Lock()
+            logger.info("Supabase client initialized.")
         except Exception as e:
-            print(f"❌ Failed to initialize Supabase: {e}")
+            logger.exception("Failed to initialize Supabase: %s", e)
             self.client = None
+            self.rest = None
 
-    def upsert_template(self, template_name: str, category: str, product_type: str, image_url: str, prompt: str):
+    async def aclose(self):
+        """
+        Flushes queued asset inserts, stops the drainer, then closes the asyncio PostgREST client's connection pool.
+        """
+        if self._insert_task and not self._insert_task.done():
+            try:
+                # Generated assets are queued without waiting, so their rows only exist once this drains
+                await asyncio.wait_for(self._insert_queue.join(), ASSET_FLUSH_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Dropping %d unflushed asset insert(s) at shutdown", self._insert_queue.qsize())
+            self._insert_task.cancel()
+            try:
+                await self._insert_task
+            except asyncio.CancelledError:
+                pass
+        if self.rest:
+            await self.rest.aclose()
+
+    async def upsert_template(self, template_name: str, category: str, product_type: str, image_url: str, prompt: str):
         """
         Upserts data into the 'template' table.
         """
@@ -31,10 +116,14 @@ class SupabaseService:
 
         try:
             # .upsert() will insert or update based on the primary key (likely template_name or an id)
-            response = self.client.table("templates").upsert(data, on_conflict="template_name, category, product_type").execute()
+            async with _SUPABASE_SEM:
+                response = await self.rest.from_("templates").upsert(data, on_conflict="template_name, category, product_type").execute()
+            # Cached filters/listings are now stale
+            with self._template_lock:
+                self._template_cache.clear()
             return response.data
         except Exception as e:
-            print(f"❌ Supabase Upsert Error: {e}")
+            logger.exception("Supabase upsert error: %s", e)
             return {"error": str(e)}
 
     def get_template_filters(self):
@@ -45,6 +134,31 @@ class SupabaseService:
         if not self.client:
             return {"error": "Supabase client not available"}
 
+        cache_key = hashkey("filters")
+        with self._template_lock:
+            cached = self._template_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            # DISTINCT + grouping happen in Postgres (supabase/migrations/*_get_template_filters.sql),
+            # so only one row per category comes over the wire
+            response = self.client.rpc("get_template_filters").execute()
+            result = {row["category"]: row["product_types"] for row in response.data}
+        except Exception as e:
+            logger.warning("get_template_filters RPC unavailable, aggregating client-side: %s", e)
+            result = self._aggregate_template_filters()
+            if "error" in result:
+                return result
+
+        with self._template_lock:
+            self._template_cache[cache_key] = result
+        return result
+
+    def _aggregate_template_filters(self):
+        """
+        Fallback for databases without the get_template_filters function.
+        """
         try:
             # Fetch both columns
             response = self.client.table("templates").select("category, product_type").execute()
@@ -64,12 +178,10 @@ class SupabaseService:
                     category_map[cat].add(prod)
             
             # Convert sets to sorted lists for the final JSON response
-            result = {cat: sorted(list(prods)) for cat, prods in category_map.items()}
-            
-            return result
+            return {cat: sorted(list(prods)) for cat, prods in category_map.items()}
 
         except Exception as e:
-            print(f"❌ Supabase Fetch Error: {e}")
+            logger.exception("Supabase fetch error: %s", e)
             return {"error": str(e)}
 
     def get_templates(self, category: str, product_type: str):
@@ -78,6 +190,12 @@ class SupabaseService:
         """
         if not self.client:
             return {"error": "Supabase client not available"}
+
+        cache_key = hashkey("templates", category, product_type)
+        with self._template_lock:
+            cached = self._template_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             # Query: Select * from templates where category = X and product_type = Y
@@ -87,17 +205,23 @@ class SupabaseService:
                 .eq("product_type", product_type)\
                 .execute()
             
+            # Only successful results are cached; errors fall through to the next request
+            with self._template_lock:
+                self._template_cache[cache_key] = response.data
             return response.data
         except Exception as e:
-            print(f"❌ Supabase Fetch Error: {e}")
+            logger.exception("Supabase fetch error: %s", e)
             return {"error": str(e)}
         
-    def insert_asset(self, user_id: str, asset_type: str, source: str, storage_path: str, metadata: dict = None):
+    async def insert_asset(self, user_id: str, asset_type: str, source: str, storage_path: str, metadata: dict = None, await_insert: bool = True, content_hash: str = None):
         """
         Inserts a record into the 'assets' table.
+        Concurrent calls are coalesced into a single multi-row insert; each caller
+        still gets back its own inserted row. With await_insert=False the row is only
+        queued and None is returned straight away.
         """
         if not self.client:
-            print("❌ Supabase client not available for asset insertion")
+            logger.error("Supabase client not available for asset insertion")
             return None
 
         data = {
@@ -107,27 +231,107 @@ class SupabaseService:
             "storage_path": storage_path,
             "metadata": metadata or {}
         }
+        # Only sent when known; bulk inserts list ?columns=, so rows without it take the column default
+        if content_hash:
+            data["content_hash"] = content_hash
+
+        if self._insert_task is None or self._insert_task.done():
+            self._insert_queue = asyncio.Queue()
+            self._insert_task = asyncio.create_task(self._drain_asset_inserts())
 
+        future = asyncio.get_running_loop().create_future()
+        await self._insert_queue.put((data, future))
+        if not await_insert:
+            return None
+        return await future
+
+    async def _drain_asset_inserts(self):
+        """
+        Background task: collects queued asset rows for a short window and flushes them together.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._insert_queue.get()]
+            deadline = loop.time() + ASSET_BATCH_WINDOW
+            while len(batch) < ASSET_BATCH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._insert_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush_asset_inserts(batch)
+            finally:
+                for _ in batch:
+                    self._insert_queue.task_done()
+
+    async def _flush_asset_inserts(self, batch: list):
+        rows = [data for data, _ in batch]
+        try:
+            async with _SUPABASE_SEM:
+                response = await self.rest.from_("assets").insert(rows).execute()
+            logger.debug("%d asset(s) inserted", len(rows))
+            # RETURNING order isn't guaranteed; storage_path is unique per object, so match on that
+            inserted = {row["storage_path"]: [row] for row in response.data}
+            results = [inserted.get(data["storage_path"]) for data in rows]
+        except Exception as e:
+            # One bad row fails the whole batch; retry individually so the others still land
+            logger.warning("Batch asset insert failed, retrying rows individually: %s", e)
+            results = [await self._insert_asset_row(data) for data in rows]
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _insert_asset_row(self, data: dict):
         try:
-            response = self.client.table("assets").insert(data).execute()
-            print(f"✅ Asset inserted: {source} {asset_type}")
+            async with _SUPABASE_SEM:
+                response = await self.rest.from_("assets").insert(data).execute()
             return response.data
         except Exception as e:
-            print(f"❌ Supabase Insert Asset Error: {e}")
+            logger.exception("Supabase insert asset error: %s", e)
             return {"error": str(e)}
 
-    def get_user_assets(self, user_id: str):
+    async def find_asset_by_hash(self, user_id: str, content_hash: str):
+        """
+        Returns the user's existing asset (asset_id, storage_path) with this content hash, or None.
+        """
+        if not self.client:
+            return None
+
+        try:
+            # Served by the partial (user_id, content_hash) index, see supabase/migrations
+            async with _SUPABASE_SEM:
+                response = await self.rest.from_("assets")\
+                    .select("asset_id,storage_path")\
+                    .eq("user_id", user_id)\
+                    .eq("content_hash", content_hash)\
+                    .limit(1)\
+                    .execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.exception("Supabase asset hash lookup error: %s", e)
+            return None
+
+    async def get_user_assets(self, user_id: str, limit: int = ASSET_PAGE_SIZE, offset: int = 0, fields: str = ASSET_LIST_FIELDS):
         """
-        Fetches assets for a specific user from the 'assets' table.
+        Fetches one page of assets for a specific user from the 'assets' table, newest first.
         """
         if not self.client:
             return {"error": "Supabase client not available"}
 
         try:
-            # Select all columns for the given user_id
-            # You might want to add .order("created_at", desc=True) if that column exists
-            response = self.client.table("assets").select("*").eq("user_id", user_id).execute()
+            # Served by the (user_id, created_at desc) index, see supabase/migrations
+            async with _SUPABASE_SEM:
+                response = await self.rest.from_("assets")\
+                    .select(fields)\
+                    .eq("user_id", user_id)\
+                    .order("created_at", desc=True)\
+                    .range(offset, offset + limit - 1)\
+                    .execute()
             return response.data
         except Exception as e:
-            print(f"❌ Supabase Fetch Assets Error: {e}")
+            logger.exception("Supabase fetch assets error: %s", e)
             return {"error": str(e)}    
\ No newline at end of file
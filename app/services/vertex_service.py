@@ -1,165 +1,395 @@
 import os
-import base64
-import io
-from PIL import Image
+import asyncio
+import logging
+import httpx
+import uuid
+import struct
+import hashlib
+import threading
+from functools import lru_cache
 from google import genai
 from google.genai import types
+from cachetools import TTLCache
 from app.core.config import get_settings
 from app.services.storage_service import StorageService
 from app.services.supabase_service import SupabaseService
-from urllib.parse import urlparse
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Delay before the first check on a long-running video generation; it backs off up to the max
+VIDEO_POLL_INTERVAL = 2
+VIDEO_POLL_MAX_INTERVAL = 10
+VIDEO_POLL_BACKOFF = 1.5
+
+# Caps concurrent Vertex generations per worker so bursts queue here instead of hitting quota (429s)
+_VERTEX_SEM = asyncio.Semaphore(settings.VERTEX_CONCURRENCY)
+
+# (user, content hash) -> (url, blob_name, asset_id) of inputs already stored, so repeats skip the lookup
+INPUT_HASH_CACHE_TTL = 600
+INPUT_HASH_CACHE_SIZE = 4096
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...), excluding DHT/JPG/DAC
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _image_dimensions(data: bytes):
+    """
+    Reads (width, height) straight from PNG, JPEG or WEBP headers without decoding.
+    Returns None for anything it doesn't recognise.
+    """
+    # PNG: IHDR is always the first chunk, right after the signature
+    if len(data) >= 24 and data[:8] == _PNG_SIGNATURE and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+
+    # JPEG: walk the marker segments up to the first start-of-frame
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                return None
+            marker = data[i + 1]
+            if marker in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return width, height
+            if marker == 0xFF:
+                # Fill byte before a marker
+                i += 1
+                continue
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+        return None
+
+    # WEBP: RIFF container, dimensions live in the first chunk header
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        chunk = data[12:16]
+        if chunk == b"VP8 " and len(data) >= 30:
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X" and len(data) >= 30:
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+
+    return None
+
+# Generation configs are only read by the SDK, so one instance per distinct value is shared across calls
+_I2I_CONFIG = types.GenerateContentConfig(response_modalities=["IMAGE"])
+
+@lru_cache(maxsize=16)
+def _t2i_config(aspect_ratio: str) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        response_modalities=["IMAGE"],
+        image_config=types.ImageConfig(aspect_ratio=aspect_ratio)
+    )
+
+def _first_image_data(response):
+    """
+    Returns the bytes of the first inline image part of a generate_content response, or None.
+    """
+    if not response.candidates or not response.candidates[0].content.parts:
+        return None
+    parts = response.candidates[0].content.parts
+    # Image responses are almost always a single part
+    if parts[0].inline_data:
+        return parts[0].inline_data.data
+    for part in parts[1:]:
+        if part.inline_data:
+            return part.inline_data.data
+    return None
+
+# Kept-alive HTTP/2 pool for the genai async client
+VERTEX_MAX_CONNECTIONS = 100
+# Per-request timeout in milliseconds; the SDK sends it on every call, overriding the httpx client's own
+VERTEX_TIMEOUT_MS = 300_000
+
+_CLIENT = None
+_CLIENT_HTTP = None
+_CLIENT_LOCK = threading.Lock()
+
+def _get_client() -> genai.Client:
+    """
+    Returns the process-wide genai client, building it on first use.
+    Every generator shares its connection pool and credential cache.
+    """
+    global _CLIENT, _CLIENT_HTTP
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                # HTTP/2 multiplexes concurrent generations over a few connections, so each doesn't pay its own TLS handshake
+                _CLIENT_HTTP = httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=VERTEX_MAX_CONNECTIONS, max_keepalive_connections=VERTEX_MAX_CONNECTIONS)
+                )
+                _CLIENT = genai.Client(
+                    vertexai=True,
+                    api_key=os.environ.get("GOOGLE_CLOUD_API_KEY"),
+                    http_options=types.HttpOptions(timeout=VERTEX_TIMEOUT_MS, httpx_async_client=_CLIENT_HTTP),
+                )
+    return _CLIENT
 
 class VertexGenerator:
-    def __init__(self):
-        # Ensure auth env var is set for the SDK
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = settings.GOOGLE_APPLICATION_CREDENTIALS
-        
+    def __init__(self, storage: StorageService = None, supabase: SupabaseService = None):
+        # Input saves running off the request path; the loop itself only keeps weak references to tasks
+        self._background_tasks = set()
+        # Only touched from the event loop, so no lock
+        self._input_cache = TTLCache(maxsize=INPUT_HASH_CACHE_SIZE, ttl=INPUT_HASH_CACHE_TTL)
         try:
-            self.client = genai.Client(
-                vertexai=True,
-                api_key=os.environ.get("GOOGLE_CLOUD_API_KEY"),
-            )
+            self.client = _get_client()
+            # asyncio-native surface of the same client; generations wait on the event loop, not a thread
+            self.aio = self.client.aio
 
-            self.storage = StorageService()
-            self.supabase = SupabaseService()
-            print(f"✅ Vertex AI Client initialized.")
+            # Reuse the app-wide services when given, so GCS/Supabase clients aren't built twice
+            self.storage = storage or StorageService()
+            self.supabase = supabase or SupabaseService()
+            logger.info("Vertex AI client initialized")
         except Exception as e:
-            print(f"❌ Failed to initialize Vertex AI: {e}")
+            logger.exception("Failed to initialize Vertex AI: %s", e)
             self.client = None
 
-    def _save_asset(self, data: bytes, user_id: str, asset_type: str, source: str, prefix: str, ext: str, mime: str, prompt: str = None, product_id: str = None) -> tuple[str, str]:
+    async def aclose(self):
+        """
+        Waits for background input saves, then closes the shared genai HTTP pool;
+        the next generator to start builds a fresh client.
+        Call before closing the storage and Supabase services those saves use.
+        """
+        global _CLIENT, _CLIENT_HTTP
+        if self._background_tasks:
+            # Failures are already logged by _background_done
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        with _CLIENT_LOCK:
+            http, _CLIENT, _CLIENT_HTTP = _CLIENT_HTTP, None, None
+        if http:
+            await http.aclose()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """
+        Starts coro as a task that finishes even if the request no longer waits for it.
+        """
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning("Background asset save failed: %s", task.exception())
+
+    async def _save_asset(self, data: bytes, user_id: str, asset_type: str, source: str, prefix: str, ext: str, mime: str, prompt: str = None, product_id: str = None, blob_name: str = None, await_insert: bool = True, content_hash: str = None) -> tuple[str, str, str]:
         """
         Helper to upload file to GCS, extract metadata, and save info to Supabase.
-        Returns a tuple of (url, asset_id).
+        Returns a tuple of (url, blob_name, asset_id); asset_id is None when await_insert is False.
         """
         # 1. Upload to GCS
         try:
-            url = self.storage.upload_bytes(data, prefix, ext, mime)
+            url, blob_name = await self.storage.upload_bytes_async(data, prefix, ext, mime, blob_name=blob_name)
         except Exception as e:
-            print(f"❌ Failed to upload asset to storage: {e}")
+            logger.error("Failed to upload asset to storage: %s", e)
             raise e
 
         # 2. Extract Metadata
-        metadata = {"size_bytes": len(data), "format": ext, "mime": mime}
+        metadata = self._asset_metadata(len(data), ext, mime, prompt, product_id)
+
+        if asset_type == "image":
+            # Best effort: a malformed header must not fail a save whose upload already succeeded
+            try:
+                dimensions = _image_dimensions(data)
+                if not dimensions:
+                    # Unknown format: let PIL parse the header (imported here so startup doesn't load it)
+                    import io
+                    from PIL import Image
+                    with Image.open(io.BytesIO(data)) as img:
+                        dimensions = img.width, img.height
+                metadata["width"], metadata["height"] = dimensions
+            except Exception as e:
+                logger.warning("Failed to extract image metadata: %s", e)
+        
+        # 3. Insert into Supabase, only once the object exists
+        asset_id = await self._record_asset(url, user_id, asset_type, source, metadata, await_insert=await_insert, content_hash=content_hash)
+        
+        return url, blob_name, asset_id
+
+    async def _save_input(self, data: bytes, user_id: str) -> tuple[str, str, str]:
+        """
+        Saves an uploaded input image, reusing the user's stored copy when the same bytes were uploaded before.
+        Returns a tuple of (url, blob_name, asset_id), like _save_asset.
+        """
+        content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+        key = (user_id, content_hash)
+        cached = self._input_cache.get(key)
+        if cached:
+            return cached
+
+        # Rows only carry content_hash once their upload has succeeded (see _save_asset),
+        # so a match always points at a stored object
+        existing = await self.supabase.find_asset_by_hash(user_id, content_hash)
+        if existing:
+            url = existing["storage_path"]
+            saved = url, self.storage.blob_name_from_url(url), existing["asset_id"]
+        else:
+            saved = await self._save_asset(
+                data, user_id, "image", "uploaded", f"{user_id}/inputs", "png", "image/png", content_hash=content_hash
+            )
+        if saved[2]:
+            self._input_cache[key] = saved
+        return saved
+
+    def _asset_metadata(self, size_bytes: int, ext: str, mime: str, prompt: str = None, product_id: str = None) -> dict:
+        metadata = {"size_bytes": size_bytes, "format": ext, "mime": mime}
         if prompt:
             metadata["prompt"] = prompt
         # Add product_id to metadata if provided
         if product_id:
             metadata["product_id"] = product_id
+        return metadata
 
-        if asset_type == "image":
-            try:
-                with Image.open(io.BytesIO(data)) as img:
-                    metadata["width"] = img.width
-                    metadata["height"] = img.height
-            except Exception as e:
-                print(f"⚠️ Failed to extract image metadata: {e}")
-        print(metadata)
-        
-        # 3. Insert into Supabase
-        result = self.supabase.insert_asset(
+    async def _record_asset(self, url: str, user_id: str, asset_type: str, source: str, metadata: dict, await_insert: bool = True, content_hash: str = None) -> str:
+        """
+        Inserts the asset row (batched with any concurrent inserts) and returns its asset_id.
+        With await_insert=False the row is only queued and None is returned.
+        """
+        logger.debug("Asset metadata: %s", metadata)
+        result = await self.supabase.insert_asset(
             user_id=user_id,
             asset_type=asset_type,
             source=source,
             storage_path=url,
-            metadata=metadata
+            metadata=metadata,
+            await_insert=await_insert,
+            content_hash=content_hash
         )
         
         # Extract asset_id from the result
         asset_id = None
         if result and isinstance(result, list) and len(result) > 0:
             asset_id = result[0].get('asset_id')
-        
-        return url, asset_id
+        return asset_id
 
-    def _process_media(self, data: bytes, prefix: str, ext: str, mime: str, user: str, asset_type: str, prompt: str, product_id: str = None) -> dict:
+    async def _process_media(self, data: bytes, prefix: str, ext: str, mime: str, user: str, asset_type: str, prompt: str, product_id: str = None) -> dict:
         try:
             # Save the GENERATED asset to GCS and Supabase
             # Pass product_id to be stored in metadata
-            url, _ = self._save_asset(data, user, asset_type, "generated", prefix, ext, mime, prompt, product_id=product_id)           
-            
-            parsed = urlparse(url)
-            
-            response = {"status": "completed", "base_url": url, "signed_url": self.storage.generate_signed_url(parsed.path.lstrip("/").split("/", 1)[1])}
+            # A v4 signed URL doesn't need the object to exist yet, so it's signed while the save runs
+            blob_name = self.storage.new_blob_name(prefix, ext)
+            (url, _, _), signed_url = await asyncio.gather(
+                self._save_asset(
+                    data, user, asset_type, "generated", prefix, ext, mime, prompt,
+                    product_id=product_id, blob_name=blob_name, await_insert=False
+                ),
+                self.storage.generate_signed_url_async(blob_name)
+            )
+            response = {"status": "completed", "base_url": url, "signed_url": signed_url}
 
             return response
         except Exception as e:
             return {"status": "failed", "error": str(e)}
 
-    def generate_text_to_image(self, prompt: str, aspect_ratio: str, user: str) -> dict:
+    async def _process_stored_media(self, blob_name: str, user: str, asset_type: str, ext: str, mime: str, prompt: str, product_id: str = None) -> dict:
+        """
+        Same as _process_media, for output Vertex has already written into our bucket.
+        """
+        try:
+            url = self.storage.public_url(blob_name)
+            size_bytes = await self.storage.blob_size_async(blob_name)
+            metadata = self._asset_metadata(size_bytes, ext, mime, prompt, product_id)
+            await self._record_asset(url, user, asset_type, "generated", metadata, await_insert=False)
+
+            signed_url = await self.storage.generate_signed_url_async(blob_name)
+            return {"status": "completed", "base_url": url, "signed_url": signed_url}
+        except Exception as e:
+            return {"status": "failed", "error": str(e)}
+
+    async def generate_text_to_image(self, prompt: str, aspect_ratio: str, user: str) -> dict:
         if not self.client: return {"status": "failed", "error": "Client unavailable"}
         
         try:
-            config = types.GenerateContentConfig(
-                response_modalities=["IMAGE"],
-                image_config=types.ImageConfig(aspect_ratio=aspect_ratio)
-            )
-            response = self.client.models.generate_content(
-                model=settings.IMAGE_MODEL_ID,
-                contents=[prompt],
-                config=config
-            )
+            async with _VERTEX_SEM:
+                response = await self.aio.models.generate_content(
+                    model=settings.IMAGE_MODEL_ID,
+                    contents=[prompt],
+                    config=_t2i_config(aspect_ratio)
+                )
             
-            if response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if part.inline_data:
-                        # Pass user and asset_type="image"
-                        # Added explicit prompt argument which was missing in original code
-                        return self._process_media(
-                            part.inline_data.data, f"{user}/t2i", "png", "image/png", user, "image", prompt
-                        )
+            image_data = _first_image_data(response)
+            if image_data:
+                # Pass user and asset_type="image"
+                # Added explicit prompt argument which was missing in original code
+                return await self._process_media(
+                    image_data, f"{user}/t2i", "png", "image/png", user, "image", prompt
+                )
             return {"status": "failed", "error": "No image generated"}
         except Exception as e:
             return {"status": "failed", "error": str(e)}
 
-    def generate_image_to_image(self, image_bytes: bytes, prompt: str, user: str, image_url: str = None, product_id: str = None) -> dict:
+    async def generate_text_to_image_batch(self, prompts: list[str], aspect_ratio: str, user: str) -> list[dict]:
+        """
+        Generates one image per prompt concurrently; results come back in prompt order.
+        Generations share the Vertex semaphore with all other requests, and their asset
+        rows land in the same coalesced Supabase insert.
+        """
+        return await asyncio.gather(*(self.generate_text_to_image(prompt, aspect_ratio, user) for prompt in prompts))
+
+    async def generate_image_to_image(self, image_bytes: bytes, prompt: str, user: str, image_url: str = None, product_id: str = None) -> dict:
         if not self.client: return {"status": "failed", "error": "Client unavailable"}
 
         # Determine which ID to associate with the output
         current_product_id = product_id
 
         try:
-            # 1. Save Input Asset (Uploaded)
+            # 1. Resolve Input Image
+            save_input = None
+            gcs_uri = self.storage.gcs_uri(image_url)
             if not image_url:
-                # Capture the asset_id of the uploaded input
-                _, asset_id = self._save_asset(image_bytes, user, "image", "uploaded", f"{user}/inputs", "png", "image/png")
-                # If no product_id was provided in request, use the uploaded asset's ID
-                if not current_product_id:
-                    current_product_id = asset_id
-            else:
-                print(f"⬇️ Fetching input image from: {image_url}")
-                fetched_bytes = self.storage.download_image_as_bytes(image_url)
+                # Saving the uploaded input doesn't depend on the model output, so it runs alongside generation
+                save_input = self._spawn(self._save_input(image_bytes, user))
+                if len(image_bytes) > settings.INLINE_IMAGE_MAX_BYTES:
+                    # Too big to inline as base64: wait for the stored copy and let Vertex read that
+                    url, _, _ = await save_input
+                    gcs_uri = self.storage.gcs_uri(url)
+            elif not gcs_uri:
+                logger.debug("Fetching input image from: %s", image_url)
+                fetched_bytes = await self.storage.download_image_as_bytes_async(image_url)
                 if fetched_bytes:
                     image_bytes = fetched_bytes
                 else:
                     return {"status": "failed", "error": "Failed to download image from provided URL"}
 
             # 2. Generate Content
-            image_part = types.Part(
-                inline_data=types.Blob(mime_type="image/png", data=image_bytes)
-            )
+            if gcs_uri:
+                # Already in our bucket: Vertex reads it directly, no download/re-upload through this pod
+                image_part = types.Part(
+                    file_data=types.FileData(file_uri=gcs_uri, mime_type="image/png")
+                )
+            else:
+                image_part = types.Part(
+                    inline_data=types.Blob(mime_type="image/png", data=image_bytes)
+                )
             text_part = types.Part(text=prompt)
 
-            response = self.client.models.generate_content(
-                model=settings.IMAGE_MODEL_ID,
-                contents=[image_part, text_part],
-                config=types.GenerateContentConfig(response_modalities=["IMAGE"])
-            )
+            async with _VERTEX_SEM:
+                response = await self.aio.models.generate_content(
+                    model=settings.IMAGE_MODEL_ID,
+                    contents=[image_part, text_part],
+                    config=_I2I_CONFIG
+                )
 
-            if response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if part.inline_data:
-                        # Pass current_product_id to be saved in generated image metadata
-                        return self._process_media(
-                            part.inline_data.data, f"{user}/i2i", "png", "image/png", user, "image", prompt, product_id=current_product_id
-                        )
+            # If no product_id was provided in request, use the uploaded asset's ID;
+            # otherwise the input save is left to finish in the background
+            if save_input and not current_product_id:
+                _, _, current_product_id = await save_input
+
+            image_data = _first_image_data(response)
+            if image_data:
+                # Pass current_product_id to be saved in generated image metadata
+                return await self._process_media(
+                    image_data, f"{user}/i2i", "png", "image/png", user, "image", prompt, product_id=current_product_id
+                )
             return {"status": "failed", "error": "No image generated"}
         except Exception as e:
             return {"status": "failed", "error": str(e)}
 
-    def generate_image_to_video(self, image_bytes: bytes, prompt: str, user: str, image_url: str = None, product_id: str = None) -> dict:
+    async def generate_image_to_video(self, image_bytes: bytes, prompt: str, user: str, image_url: str = None, product_id: str = None) -> dict:
         if not self.client: return {"status": "failed", "error": "Client unavailable"}
         
         # Determine which ID to associate with the output
@@ -167,36 +397,63 @@ class VertexGenerator:
         
         try:
             # 1. Save Input Asset (Uploaded)
+            save_input = None
+            gcs_uri = self.storage.gcs_uri(image_url)
             if not image_url:
-                # Capture the asset_id of the uploaded input
-                _, asset_id = self._save_asset(image_bytes, user, "image", "uploaded", f"{user}/inputs", "png", "image/png")
-                
-                # If no product_id was provided in request, use the uploaded asset's ID
-                if not current_product_id:
-                    current_product_id = asset_id
-            else:
-                print(f"⬇️ Fetching input image from: {image_url}")
-                fetched_bytes = self.storage.download_image_as_bytes(image_url)
+                # Saving the uploaded input doesn't depend on the model output, so it runs alongside generation
+                save_input = self._spawn(self._save_input(image_bytes, user))
+                if len(image_bytes) > settings.INLINE_IMAGE_MAX_BYTES:
+                    # Too big to inline as base64: wait for the stored copy and let Vertex read that
+                    url, _, _ = await save_input
+                    gcs_uri = self.storage.gcs_uri(url)
+            elif not gcs_uri:
+                logger.debug("Fetching input image from: %s", image_url)
+                fetched_bytes = await self.storage.download_image_as_bytes_async(image_url)
                 if fetched_bytes:
                     image_bytes = fetched_bytes
                 else:
                     return {"status": "failed", "error": "Failed to download image from provided URL"}
 
             # 2. Generate Content
-            operation = self.client.models.generate_videos(
-                model=settings.VIDEO_MODEL_ID,
-                prompt=prompt,
-                image=types.Image(image_bytes=image_bytes, mime_type="image/png"),
-                config=types.GenerateVideosConfig(aspect_ratio="16:9", fps=24)
-            )
-            
-            result = operation.result() if hasattr(operation, 'result') else operation
+            # Vertex writes the MP4 straight into our bucket under this prefix
+            output_gcs_uri = f"gs://{settings.GCS_BUCKET_NAME}/{user}/vi/{uuid.uuid4().hex}/"
+            # The slot is held per RPC only, so minutes-long video jobs don't starve image generations
+            async with _VERTEX_SEM:
+                operation = await self.aio.models.generate_videos(
+                    model=settings.VIDEO_MODEL_ID,
+                    prompt=prompt,
+                    # Inputs already in our bucket are passed by URI instead of as bytes
+                    image=types.Image(gcs_uri=gcs_uri, mime_type="image/png") if gcs_uri else types.Image(image_bytes=image_bytes, mime_type="image/png"),
+                    config=types.GenerateVideosConfig(aspect_ratio="16:9", fps=24, output_gcs_uri=output_gcs_uri)
+                )
+
+            # Video generation is a long-running operation; poll it without blocking the loop
+            delay = VIDEO_POLL_INTERVAL
+            while not operation.done:
+                await asyncio.sleep(delay)
+                async with _VERTEX_SEM:
+                    operation = await self.aio.operations.get(operation)
+                delay = min(delay * VIDEO_POLL_BACKOFF, VIDEO_POLL_MAX_INTERVAL)
+
+            if operation.error:
+                return {"status": "failed", "error": str(operation.error)}
+            result = operation.response
+
+            # If no product_id was provided in request, use the uploaded asset's ID
+            if save_input and not current_product_id:
+                _, _, current_product_id = await save_input
 
             if hasattr(result, 'generated_videos'):
-                video_bytes = result.generated_videos[0].video.video_bytes
+                video = result.generated_videos[0].video
                 # Pass current_product_id to be saved in generated video metadata
-                return self._process_media(
-                    video_bytes, f"{user}/vi", "mp4", "video/mp4", user, "video", prompt, product_id=current_product_id
+                blob_name = self.storage.blob_name_from_gcs_uri(video.uri)
+                if blob_name:
+                    # Already stored by Vertex: only record it, the video never passes through this process
+                    return await self._process_stored_media(
+                        blob_name, user, "video", "mp4", "video/mp4", prompt, product_id=current_product_id
+                    )
+                return await self._process_media(
+                    video.video_bytes, f"{user}/vi", "mp4", "video/mp4", user, "video", prompt, product_id=current_product_id
                 )
             
             return {"status": "failed", "error": "No video generated"}
@@ -0,0 +1,12 @@
+-- Category -> distinct product types, aggregated in Postgres for /templates/filters.
+-- Called from SupabaseService.get_template_filters via client.rpc("get_template_filters").
+create or replace function public.get_template_filters()
+returns table (category text, product_types text[])
+language sql
+stable
+as $$
+    select category, array_agg(distinct product_type order by product_type) as product_types
+    from public.templates
+    where category is not null and product_type is not null
+    group by category;
+$$;
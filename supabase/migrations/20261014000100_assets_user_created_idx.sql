@@ -0,0 +1,2 @@
+-- Matches the /assets listing: filter by user, newest first, paginated with range().
+create index if not exists assets_user_created_idx on public.assets (user_id, created_at desc);
@@ -0,0 +1,5 @@
+-- Uploaded inputs are matched by content, so a re-used image isn't stored twice.
+alter table public.assets add column if not exists content_hash text;
+
+create index if not exists assets_user_content_hash_idx on public.assets (user_id, content_hash)
+    where content_hash is not null;